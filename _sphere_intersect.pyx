@@ -0,0 +1,28 @@
+# cython: language_level=3, cdivision=True
+#
+# Compiled ray/sphere test for Sphere._t. Build in place with
+#
+#   python setup.py build_ext --inplace
+
+from libc.math cimport sqrt
+
+# (ox, oy, oz) is the start of the ray, (dx, dy, dz) its normalised
+# direction, (cx, cy, cz) the centre of the sphere and r2 its squared radius
+#
+# returns the distance along the ray to the sphere, or -1 if it misses
+cpdef double intersect(double ox, double oy, double oz,
+                       double dx, double dy, double dz,
+                       double cx, double cy, double cz, double r2) noexcept nogil:
+    cdef double ocx = ox - cx
+    cdef double ocy = oy - cy
+    cdef double ocz = oz - cz
+    cdef double half_b = dx*ocx + dy*ocy + dz*ocz
+    cdef double c = ocx*ocx + ocy*ocy + ocz*ocz - r2
+    cdef double D = half_b*half_b - c
+    cdef double sd, t
+    if D < 0: return -1
+    sd = sqrt(D)
+    t = -half_b - sd
+    if t < 0: t = -half_b + sd
+    if t < 0: return -1
+    return t
@@ -0,0 +1,161 @@
+import math
+
+from numba import njit, prange
+
+#
+#   Compiled renderer
+#
+#   The same maths as Sphere, Triangle and PhongLight in
+#   renderer_skeleton.py, over flat float arrays instead of vec3s
+#
+
+# fastmath=True would include 'ninf' and 'nnan', letting LLVM assume no
+# infinities, but t_min starts at math.inf and is compared against
+FASTMATH = {'nsz', 'arcp', 'contract', 'afn', 'reassoc'}
+
+@njit(fastmath=FASTMATH, cache=True)
+def cross_len(ax, ay, az, bx, by, bz):
+    cx = ay*bz - az*by
+    cy = az*bx - ax*bz
+    cz = ax*by - ay*bx
+    return math.sqrt(cx*cx + cy*cy + cz*cz)
+
+# camera (3) is the ray origin
+# s_cx, s_cy, s_cz, s_r2 (N) are the sphere centres and squared radii
+# tri_v (Mx3x3), tri_n (Mx3) are the triangle vertices and normals
+# light_pos, light_diffuse, light_specular (Lx3) describe the PhongLights
+# dirs (height x width x 3) are the normalised ray directions per pixel
+# tile_size (int) is the side of the square tiles rows are grouped into
+# out (height x width x 3 uint8) is filled with the image
+@njit(parallel=True, fastmath=FASTMATH, cache=True)
+def render_kernel(camera, s_cx, s_cy, s_cz, s_r2, tri_v, tri_n,
+                  light_pos, light_diffuse, light_specular,
+                  dirs, tile_size, out):
+    ox = camera[0]
+    oy = camera[1]
+    oz = camera[2]
+    n_lights = light_pos.shape[0]
+    height = dirs.shape[0]
+    width = dirs.shape[1]
+    tiles_x = (width + tile_size - 1) // tile_size
+    tiles_y = (height + tile_size - 1) // tile_size
+
+    for tile in prange(tiles_x * tiles_y):
+        ty = (tile // tiles_x) * tile_size
+        tx = (tile % tiles_x) * tile_size
+        for j in range(ty, min(ty + tile_size, height)):
+            for i in range(tx, min(tx + tile_size, width)):
+                dx = dirs[j, i, 0]
+                dy = dirs[j, i, 1]
+                dz = dirs[j, i, 2]
+
+                t_min = math.inf
+                hit_sphere = -1
+                hit_tri = -1
+
+                for k in range(s_r2.shape[0]):
+                    ocx = ox - s_cx[k]
+                    ocy = oy - s_cy[k]
+                    ocz = oz - s_cz[k]
+                    half_b = dx*ocx + dy*ocy + dz*ocz
+                    c = ocx*ocx + ocy*ocy + ocz*ocz - s_r2[k]
+                    D = half_b*half_b - c
+                    if D < 0: continue
+                    sd = math.sqrt(D)
+                    t = -half_b - sd
+                    if t < 0: t = -half_b + sd
+                    if t >= 0 and t < t_min:
+                        t_min = t
+                        hit_sphere = k
+
+                for k in range(tri_n.shape[0]):
+                    nx = tri_n[k, 0]
+                    ny = tri_n[k, 1]
+                    nz = tri_n[k, 2]
+                    denom = dx*nx + dy*ny + dz*nz
+                    if denom <= 0.00001 and denom >= -0.00001: continue
+                    t = (nx*(tri_v[k, 0, 0] - ox) + ny*(tri_v[k, 0, 1] - oy)
+                         + nz*(tri_v[k, 0, 2] - oz)) / denom
+                    if t <= 0.0001 or t >= t_min: continue
+                    px = ox + t*dx
+                    py = oy + t*dy
+                    pz = oz + t*dz
+                    ux = tri_v[k, 1, 0] - tri_v[k, 0, 0]
+                    uy = tri_v[k, 1, 1] - tri_v[k, 0, 1]
+                    uz = tri_v[k, 1, 2] - tri_v[k, 0, 2]
+                    vx = tri_v[k, 2, 0] - tri_v[k, 0, 0]
+                    vy = tri_v[k, 2, 1] - tri_v[k, 0, 1]
+                    vz = tri_v[k, 2, 2] - tri_v[k, 0, 2]
+                    p1x = px - tri_v[k, 0, 0]
+                    p1y = py - tri_v[k, 0, 1]
+                    p1z = pz - tri_v[k, 0, 2]
+                    area1 = cross_len(ux, uy, uz, p1x, p1y, p1z)
+                    area2 = cross_len(vx, vy, vz, p1x, p1y, p1z)
+                    area3 = cross_len(
+                        tri_v[k, 2, 0] - tri_v[k, 1, 0],
+                        tri_v[k, 2, 1] - tri_v[k, 1, 1],
+                        tri_v[k, 2, 2] - tri_v[k, 1, 2],
+                        px - tri_v[k, 1, 0], py - tri_v[k, 1, 1], pz - tri_v[k, 1, 2])
+                    diff = cross_len(ux, uy, uz, vx, vy, vz) - area1 - area2 - area3
+                    if diff <= 0.001 and diff >= -0.001:
+                        t_min = t
+                        hit_tri = k
+                        hit_sphere = -1
+
+                if hit_sphere < 0 and hit_tri < 0:
+                    out[j, i, 0] = 255
+                    out[j, i, 1] = 255
+                    out[j, i, 2] = 255
+                    continue
+
+                px = ox + t_min*dx
+                py = oy + t_min*dy
+                pz = oz + t_min*dz
+                if hit_sphere >= 0:
+                    nx = px - s_cx[hit_sphere]
+                    ny = py - s_cy[hit_sphere]
+                    nz = pz - s_cz[hit_sphere]
+                    inv = 1.0 / math.sqrt(nx*nx + ny*ny + nz*nz)
+                    nx *= inv
+                    ny *= inv
+                    nz *= inv
+                else:
+                    nx = tri_n[hit_tri, 0]
+                    ny = tri_n[hit_tri, 1]
+                    nz = tri_n[hit_tri, 2]
+
+                vdx = ox - px
+                vdy = oy - py
+                vdz = oz - pz
+                inv = 1.0 / math.sqrt(vdx*vdx + vdy*vdy + vdz*vdz)
+                vdx *= inv
+                vdy *= inv
+                vdz *= inv
+
+                r = 0.0
+                g = 0.0
+                b = 0.0
+                for l in range(n_lights):
+                    lx = light_pos[l, 0] - px
+                    ly = light_pos[l, 1] - py
+                    lz = light_pos[l, 2] - pz
+                    inv = 1.0 / math.sqrt(lx*lx + ly*ly + lz*lz)
+                    lx *= inv
+                    ly *= inv
+                    lz *= inv
+                    diff = max(0.0, lx*nx + ly*ny + lz*nz)
+                    spec = 0.0
+                    if diff > 0.0001:
+                        rx = 2*nx + lx
+                        ry = 2*ny + ly
+                        rz = 2*nz + lz
+                        inv = 1.0 / math.sqrt(rx*rx + ry*ry + rz*rz)
+                        spec = max(0.0, (vdx*rx + vdy*ry + vdz*rz) * inv) ** 10.0
+                    r += diff*light_diffuse[l, 0] + spec*light_specular[l, 0]
+                    g += diff*light_diffuse[l, 1] + spec*light_specular[l, 1]
+                    b += diff*light_diffuse[l, 2] + spec*light_specular[l, 2]
+
+                scale = 255.0 / n_lights
+                out[j, i, 0] = min(255.0, max(0.0, r*scale))
+                out[j, i, 1] = min(255.0, max(0.0, g*scale))
+                out[j, i, 2] = min(255.0, max(0.0, b*scale))
@@ -1,49 +1,135 @@
+"""
+A ray tracer for the practical. Renderer.render_image renders with
+NumPy, or with the numba kernel in kernels.py when numba is installed
+and the image is large. Importing numba and loading the cached kernel
+costs around a third of a second (several seconds the first time it
+compiles), which is longer than NumPy takes for the default 256x256
+image, so smaller images only use the kernel once it is loaded.
+
+The per-pixel paths (python renderer_skeleton.py serial|processes) are
+plain Python, written to suit a tracing JIT, so run them with pypy3
+where it is available.
+"""
+
 from PIL import Image
+import multiprocessing
 import math
+import sys
+import numpy as np
 
 from helpers import *
 
+# None until load_kernel has tried to import it, False if numba is missing
+render_kernel = None
+
+# Images with fewer pixels than this render faster with NumPy than it
+# takes to import numba and load the kernel
+KERNEL_MIN_PIXELS = 1536 * 1536
+
+# returns render_kernel, importing kernels.py on first use, or False
+# if numba is not installed
+def load_kernel():
+    global render_kernel
+    if render_kernel is None:
+        try:
+            from kernels import render_kernel
+        except ImportError:
+            render_kernel = False
+    return render_kernel
+
+try:
+    from _sphere_intersect import intersect as sphere_intersect
+except ImportError:
+    sphere_intersect = None
+
 #
 #   Renderables
 #
 
 class Renderable:
+    __slots__ = ()
+
     # Should return a RayIntersection for the intersection between
-    # the ray from origin with direction
+    # the ray from origin with direction. direction is already
+    # normalised by Renderer.raycast, so direction.dot(direction) == 1
     def intersect(self, origin, direction): pass
 
     # Should return the normal at the given location
     def normal(self, location): pass
 
+    # origin (3x1 array) is the start of every ray
+    # directions (3xN array) are the normalised ray directions
+    #
+    # should return an array of the N distances along each ray to
+    # the renderable, np.inf where the ray misses
+    def intersect_batch(self, origin, directions):
+        raise NotImplementedError(f"{type(self).__name__} has no intersect_batch")
+
+    # locations (3xN array) are points on the renderable
+    #
+    # should return a 3xN array of normals at those points
+    def normal_batch(self, locations):
+        raise NotImplementedError(f"{type(self).__name__} has no normal_batch")
+
 class Sphere(Renderable):
+    __slots__ = ('origin', '_radius', 'r2')
+
     def __init__(self, origin, radius):
         self.origin = origin
         self.radius = radius
 
+    # the squared radius is kept alongside as r2, so intersect never
+    # squares it per ray
+    @property
+    def radius(self):
+        return self._radius
+
+    @radius.setter
+    def radius(self, radius):
+        self._radius = radius
+        self.r2 = float(radius) * float(radius)
+
     # origin (vec3) represents the start of the ray
-    # direction (vec3) represents the direction of the ray
+    # direction (vec3) represents the direction of the ray, and must
+    # be normalised
     #
     # should return a RayIntersection representing the point where
     # the input ray intersects the sphere
     def intersect(self, origin, direction):
-        a = direction.dot(direction)
-        b = 2 * direction.dot(origin - self.origin)
-        c = (origin - self.origin).dot(origin - self.origin) - self.radius * self.radius
-        D = b * b - 4 * a * c
-        len = 0
-        intersection = origin
-        if(D >= 0):
-        	x1 = (-b + math.sqrt(D)) / (2*a)
-        	x2 = (-b - math.sqrt(D)) / (2*a)
-        	len = min(x1,x2)
-        	if(len < 0): len = max(x1,x2)
-        else:
-        	len = -1
-        if(len >= 0):
-        	intersection = len * direction + origin
-        if(len < 0):
-        	return None;
-        return RayIntersection(origin, direction, self, intersection, len)
+        len = self._t(origin.x, origin.y, origin.z, direction.x, direction.y, direction.z)
+        if len == math.inf: return None
+        return self._hit(origin, direction, len)
+
+    # as intersect, but on plain floats so no objects are built, and in
+    # C when the _sphere_intersect extension has been built (chosen once,
+    # when the class is defined)
+    #
+    # returns the distance along the ray to the sphere, or math.inf
+    if sphere_intersect is not None:
+        def _t(self, ox, oy, oz, dx, dy, dz):
+            origin = self.origin
+            len = sphere_intersect(ox, oy, oz, dx, dy, dz, origin.x, origin.y, origin.z, self.r2)
+            return math.inf if len < 0 else len
+    else:
+        def _t(self, ox, oy, oz, dx, dy, dz):
+            ocx = ox - self.origin.x
+            ocy = oy - self.origin.y
+            ocz = oz - self.origin.z
+            half_b = dx*ocx + dy*ocy + dz*ocz
+            c = ocx*ocx + ocy*ocy + ocz*ocz - self.r2
+            D = half_b * half_b - c
+            if D < 0: return math.inf
+            sd = math.sqrt(D)
+            len = -half_b - sd
+            if len < 0: len = -half_b + sd
+            if len < 0: return math.inf
+            return len
+
+    # returns the RayIntersection len along the ray, as found by _t
+    def _hit(self, origin, direction, len):
+        location = vec3(origin.x + direction.x*len, origin.y + direction.y*len, origin.z + direction.z*len)
+        return RayIntersection(origin, direction, self, location, len)
+
     # location (vec3) is a point on the sphere
     # 
     # should return a vec3 representing the normal at that point
@@ -51,7 +137,23 @@ class Sphere(Renderable):
         normal = (location - self.origin).norm()  
         return normal
 
+    def intersect_batch(self, origin, directions):
+        oc = origin - to_array(self.origin, directions.dtype)
+        half_b = (directions * oc).sum(axis=0)
+        c = (oc * oc).sum() - self.r2
+        D = half_b * half_b - c
+        sd = np.sqrt(np.maximum(D, 0))
+        len = -half_b - sd
+        len = np.where(len < 0, -half_b + sd, len)
+        return np.where((D >= 0) & (len >= 0), len, np.inf)
+
+    def normal_batch(self, locations):
+        normal = locations - to_array(self.origin, locations.dtype)
+        return normal / np.sqrt((normal * normal).sum(axis=0))
+
 class Triangle(Renderable):
+    __slots__ = ('v1', 'v2', 'v3', 'normal_')
+
     # Should return a RayIntersection for the intersection between
     # the ray from origin with direction
     def __init__(self, v1, v2, v3):
@@ -61,8 +163,9 @@ class Triangle(Renderable):
     	self.normal_ = (self.v2 - self.v1).cross(self.v3 - self.v1).norm()
 
     def intersect(self, origin, direction): 
-    	if(direction.dot(self.normal_) <= 0.00001 and direction.dot(self.normal_) >= -0.00001): return None  
-    	len = self.normal_.dot(self.v1 - origin) / (self.normal_.dot(direction))
+    	denom = direction.dot(self.normal_)
+    	if(denom <= 0.00001 and denom >= -0.00001): return None  
+    	len = self.normal_.dot(self.v1 - origin) / denom
     	if(len <= 0.0001): return None
     	#print(len)
     	p = origin + len * direction
@@ -83,6 +186,28 @@ class Triangle(Renderable):
     def normal(self, location):
     	return self.normal_
 
+    def intersect_batch(self, origin, directions):
+        n = to_array(self.normal_, directions.dtype)
+        v1 = to_array(self.v1, directions.dtype)
+        v2 = to_array(self.v2, directions.dtype)
+        v3 = to_array(self.v3, directions.dtype)
+        denom = (directions * n).sum(axis=0)
+        parallel = (denom <= 0.00001) & (denom >= -0.00001)
+        len = (n * (v1 - origin)).sum() / np.where(parallel, 1, denom)
+        p = origin + len * directions
+        u = v2 - v1
+        v = v3 - v1
+        area1 = norm_batch(np.cross(u, p - v1, axis=0))
+        area2 = norm_batch(np.cross(v, p - v1, axis=0))
+        area3 = norm_batch(np.cross(v3 - v2, p - v2, axis=0))
+        totalArea = norm_batch(np.cross(u, v, axis=0))
+        diff = totalArea - area1 - area2 - area3
+        hit = ~parallel & (len > 0.0001) & (diff <= 0.001) & (diff >= -0.001)
+        return np.where(hit, len, np.inf)
+
+    def normal_batch(self, locations):
+        return np.broadcast_to(to_array(self.normal_, locations.dtype), locations.shape)
+
 #
 #   Lights
 #
@@ -97,6 +222,14 @@ class Light:
     def illumination(self, renderable, location, renderer):
         return self.colour
 
+    # locations (3xN array) are points on renderable
+    #
+    # should return a 3xN array of the colour at each location
+    def illumination_batch(self, renderable, locations, renderer):
+        if not has_batch(type(self), 'illumination', 'illumination_batch'):
+            raise NotImplementedError(f"{type(self).__name__} has no illumination_batch")
+        return np.broadcast_to(to_array(self.colour, locations.dtype), locations.shape)
+
 class PhongLight(Light):
     def __init__(self, pos, specular=None, diffuse=None):
         self.position = pos
@@ -111,15 +244,47 @@ class PhongLight(Light):
     # and brightness that the point is illuminated to by
     # this light (each colour channel should be 0-1)
     def illumination(self, renderable, location, renderer):
-       	norm = renderable.normal(location)       
-       	direct = self.position - location;
-        direct = direct.norm();
-        u = (location - self.position).norm()
-        v = (2*renderable.normal(location) - u).norm()
-        spec = max(0.0, (renderer.camera - location).norm().dot(v)) ** 10.0
-        diff = max(0, direct.dot(norm))
-        if(diff <= 0.0001): spec = 0.0
-        return diff * self.diffuse + spec * self.specular
+        norm = renderable.normal(location)
+        dx = self.position.x - location.x
+        dy = self.position.y - location.y
+        dz = self.position.z - location.z
+        inv = 1.0 / math.sqrt(dx*dx + dy*dy + dz*dz)
+        dx *= inv
+        dy *= inv
+        dz *= inv
+        diff = max(0.0, dx*norm.x + dy*norm.y + dz*norm.z)
+
+        spec = 0.0
+        if(diff > 0.0001):
+            # reflect direction about the normal, then compare with the
+            # direction to the camera
+            vx = 2*norm.x + dx
+            vy = 2*norm.y + dy
+            vz = 2*norm.z + dz
+            cx = renderer.camera.x - location.x
+            cy = renderer.camera.y - location.y
+            cz = renderer.camera.z - location.z
+            spec = (vx*cx + vy*cy + vz*cz) / math.sqrt((vx*vx + vy*vy + vz*vz) * (cx*cx + cy*cy + cz*cz))
+            spec = max(0.0, spec) ** 10.0
+
+        return vec3(
+            diff*self.diffuse.x + spec*self.specular.x,
+            diff*self.diffuse.y + spec*self.specular.y,
+            diff*self.diffuse.z + spec*self.specular.z
+        )
+
+    def illumination_batch(self, renderable, locations, renderer):
+        norm = renderable.normal_batch(locations)
+        direct = to_array(self.position, locations.dtype) - locations
+        direct = direct / norm_batch(direct)
+        v = 2 * norm + direct
+        view = to_array(renderer.camera, locations.dtype) - locations
+        spec = (view * v).sum(axis=0) / np.sqrt((v * v).sum(axis=0) * (view * view).sum(axis=0))
+        spec = np.maximum(0, spec) ** 10
+        diff = np.maximum(0, (direct * norm).sum(axis=0))
+        spec = np.where(diff <= 0.0001, 0, spec)
+        return (diff * to_array(self.diffuse, locations.dtype)
+                + spec * to_array(self.specular, locations.dtype))
 
 #
 #   Renderer
@@ -131,23 +296,46 @@ class Renderer:
         self.lights = []
         self.renderables = []
 
+    # the s_ arrays from _build_soa and the cached ray directions are
+    # rebuilt when needed, so leave them out of the copy of the scene
+    # sent to each worker process
+    def __getstate__(self):
+        return {
+            k: v for k, v in self.__dict__.items()
+            if not k.startswith('s_') and k != '_directions'
+        }
+
     # origin (vec3) and direction (vec3) describe the ray
-    # exclude (list) is a list of renderables to ignore
+    # exclude_ids (frozenset) holds the id() of each renderable to
+    # ignore, e.g. frozenset((id(renderable),)) for a shadow ray
     #
     # returns the nearest intersection between the ray
     # and any renderables
-    def raycast(self, origin, direction, exclude=None):
-        if not exclude: exclude = []
-
+    def raycast(self, origin, direction, exclude_ids=frozenset()):
         d_norm = direction.norm()
-        intersections = [
-            r.intersect(origin, d_norm)
-            for r in self.renderables
-            if r not in exclude
-        ]
-        intersections = [r for r in intersections if r]
-        if not intersections: return False
-        return min(intersections, key=lambda x:x.length)
+        ox, oy, oz = origin.x, origin.y, origin.z
+        dx, dy, dz = d_norm.x, d_norm.y, d_norm.z
+
+        # spheres only report a distance, and the RayIntersection is
+        # built once for whichever sphere is nearest
+        best = None
+        best_sphere = None
+        best_t = math.inf
+        for r in self.renderables:
+            if id(r) in exclude_ids: continue
+            if type(r) is Sphere:
+                t = r._t(ox, oy, oz, dx, dy, dz)
+                if t < best_t:
+                    best_t = t
+                    best_sphere = r
+            else:
+                hit = r.intersect(origin, d_norm)
+                if hit and hit.length < best_t:
+                    best_t = hit.length
+                    best = hit
+                    best_sphere = None
+        if best_sphere is not None: return best_sphere._hit(origin, d_norm, best_t)
+        return best or False
 
     # ray_intersection (RayIntersection) is an intersection
     #
@@ -164,7 +352,7 @@ class Renderer:
     # width (int), height (int), screen size
     #
     # should return the colour of the pixel at
-    # x,y on a screen of width x height
+    # x,y on a screen of width x height, each channel 0-255
     def render(self, x, y, width, height):
         result = self.raycast(
             self.camera,
@@ -177,10 +365,264 @@ class Renderer:
 
         if result:
             lighting = self.get_lighting(result)
-            return (int(lighting.x*255),int(lighting.y*255),int(lighting.z*255))
+            return (
+                min(255, max(0, int(lighting.x*255))),
+                min(255, max(0, int(lighting.y*255))),
+                min(255, max(0, int(lighting.z*255)))
+            )
         else:
             return (255,255,255)   
 
+    # j (int) is the row to render, on a screen of width x height
+    # out (bytearray) receives the RGB values of pixels start to stop-1
+    # of the row, beginning at off (by default where the row sits in a
+    # width x height x 3 buffer)
+    #
+    # does the same as render for each pixel, with the per-row work and
+    # attribute lookups done once
+    def render_row(self, j, width, height, out, off=None, start=0, stop=None):
+        if off is None: off = (j*width + start) * 3
+        if stop is None: stop = width
+        camera = self.camera
+        raycast = self.raycast
+        get_lighting = self.get_lighting
+        y = j/height - 0.5
+
+        for i in range(start, stop):
+            result = raycast(camera, vec3(i/width - 0.5, y, 1))
+            if result:
+                lighting = get_lighting(result)
+                out[off] = min(255, max(0, int(lighting.x*255)))
+                out[off+1] = min(255, max(0, int(lighting.y*255)))
+                out[off+2] = min(255, max(0, int(lighting.z*255)))
+            else:
+                out[off] = out[off+1] = out[off+2] = 255
+            off += 3
+
+    # width (int), height (int), screen size
+    #
+    # should return a height x width x 3 array of uint8 (red, green,
+    # blue), using the compiled kernel when numba is installed, the
+    # scene only holds types it knows about and the image is large
+    # enough to pay for loading it, the NumPy path when every
+    # renderable and light has batch methods, and render_serial otherwise
+    def render_image(self, width, height):
+        if not self._supports_batch():
+            return render_serial(self, width, height)
+        if render_kernel is None and width * height < KERNEL_MIN_PIXELS:
+            return self.render_image_numpy(width, height)
+        scene = self._pack_scene()
+        if scene is None:
+            return self.render_image_numpy(width, height)
+        kernel = load_kernel()
+        if not kernel:
+            return self.render_image_numpy(width, height)
+        output = np.empty((height, width, 3), dtype=np.uint8)
+        kernel(*scene, self.directions(width, height), TILE_SIZE, output)
+        return output
+
+    # width (int), height (int), screen size
+    #
+    # returns a height x width x 3 float32 array of the normalised
+    # direction of the ray through each pixel, as Renderer.render
+    # casts them. They depend only on the screen size, so are built
+    # once and kept for later frames
+    def directions(self, width, height):
+        cached = getattr(self, '_directions', None)
+        if cached is not None and cached.shape[:2] == (height, width):
+            return cached
+
+        xs = np.arange(width, dtype=np.float32) / width - 0.5
+        ys = np.arange(height, dtype=np.float32) / height - 0.5
+        dx, dy = np.meshgrid(xs, ys)
+        directions = np.stack((dx, dy, np.ones_like(dx)), axis=-1)
+        directions /= np.sqrt((directions * directions).sum(axis=-1, keepdims=True))
+        self._directions = directions
+        return directions
+
+    # whether every renderable and light implements its batch methods
+    # alongside the scalar ones they mirror, so a subclass that only
+    # overrides intersect, normal or illumination is never rendered
+    # with its parent's batch maths
+    def _supports_batch(self):
+        return (
+            all(
+                has_batch(type(r), 'intersect', 'intersect_batch')
+                and has_batch(type(r), 'normal', 'normal_batch')
+                for r in self.renderables
+            )
+            and all(has_batch(type(l), 'illumination', 'illumination_batch') for l in self.lights)
+        )
+
+    # returns the scene as the flat arrays render_kernel takes, or
+    # None if it holds anything other than Spheres, Triangles and
+    # PhongLights
+    def _pack_scene(self):
+        if any(type(r) not in (Sphere, Triangle) for r in self.renderables): return None
+        if not self.lights or any(type(l) is not PhongLight for l in self.lights): return None
+
+        self._build_soa()
+        triangles = self.s_others
+        xyz = lambda v: (v.x, v.y, v.z)
+        return (
+            np.array(xyz(self.camera), dtype=np.float64),
+            self.s_cx, self.s_cy, self.s_cz, self.s_r2,
+            np.array([[xyz(t.v1), xyz(t.v2), xyz(t.v3)] for t in triangles], dtype=np.float64).reshape(-1, 3, 3),
+            np.array([xyz(t.normal_) for t in triangles], dtype=np.float64).reshape(-1, 3),
+            np.array([xyz(l.position) for l in self.lights], dtype=np.float64),
+            np.array([xyz(l.diffuse) for l in self.lights], dtype=np.float64),
+            np.array([xyz(l.specular) for l in self.lights], dtype=np.float64),
+        )
+
+    # splits the renderables into Spheres, stored as parallel arrays
+    # of centres and squared radii (s_cx, s_cy, s_cz, s_r2, with
+    # s_index their positions in self.renderables), and everything
+    # else (s_others, at positions s_others_index)
+    def _build_soa(self):
+        spheres = [(i, r) for i, r in enumerate(self.renderables) if type(r) is Sphere]
+        others = [(i, r) for i, r in enumerate(self.renderables) if type(r) is not Sphere]
+        self.s_index = np.array([i for i, _ in spheres], dtype=np.int32)
+        self.s_cx = np.array([r.origin.x for _, r in spheres], dtype=np.float32)
+        self.s_cy = np.array([r.origin.y for _, r in spheres], dtype=np.float32)
+        self.s_cz = np.array([r.origin.z for _, r in spheres], dtype=np.float32)
+        self.s_r2 = np.array([r.r2 for _, r in spheres], dtype=np.float32)
+        self.s_others_index = [i for i, _ in others]
+        self.s_others = [r for _, r in others]
+
+    # width (int), height (int), screen size
+    #
+    # renders every pixel at once as whole-image array operations,
+    # returning a height x width x 3 array of uint8 (red, green, blue)
+    def render_image_numpy(self, width, height):
+        # float32 is as narrow as the ray maths goes. NumPy has no
+        # native float16 arithmetic on the CPU, so half precision
+        # arrays run many times slower, and the triangle's 0.001 area
+        # test needs more than float16's three significant digits
+        #
+        # directions are copied to contiguous 3xN rows, the layout the
+        # batch methods expect
+        directions = np.ascontiguousarray(self.directions(width, height).reshape(-1, 3).T)
+        origin = to_array(self.camera, np.float32)
+
+        nearest = np.full(width * height, np.inf, dtype=np.float32)
+        hit = np.full(width * height, -1, dtype=np.int32)
+
+        # one sphere at a time from the parallel arrays, so the
+        # temporaries stay the size of the ray batch
+        self._build_soa()
+        dx, dy, dz = directions
+        for k, i in enumerate(self.s_index):
+            ocx = self.camera.x - self.s_cx[k]
+            ocy = self.camera.y - self.s_cy[k]
+            ocz = self.camera.z - self.s_cz[k]
+            half_b = ocx*dx + ocy*dy + ocz*dz
+            c = ocx*ocx + ocy*ocy + ocz*ocz - self.s_r2[k]
+            disc = half_b*half_b - c
+            sd = np.sqrt(np.maximum(disc, 0))
+            t = -half_b - sd
+            t = np.where(t < 0, -half_b + sd, t)
+            t = np.where((disc >= 0) & (t >= 0), t, np.inf)
+            closer = t < nearest
+            nearest[closer] = t[closer]
+            hit[closer] = i
+
+        for i, r in zip(self.s_others_index, self.s_others):
+            t = r.intersect_batch(origin, directions)
+            closer = t < nearest
+            nearest[closer] = t[closer]
+            hit[closer] = i
+
+        output = np.full((width * height, 3), 255, dtype=np.uint8)
+        for i, r in enumerate(self.renderables):
+            mask = hit == i
+            if not mask.any(): continue
+            locations = origin + directions[:, mask] * nearest[mask]
+            lighting = sum(
+                light.illumination_batch(r, locations, self)
+                for light in self.lights
+            ) / len(self.lights)
+            output[mask] = np.clip(lighting * 255, 0, 255).T
+        return output.reshape(height, width, 3)
+
+# cls (type) is a Renderable or Light class
+#
+# returns whether the class providing cls's scalar method also
+# provides the batch method, i.e. the two were written together
+def has_batch(cls, scalar, batch):
+    for klass in cls.__mro__:
+        if scalar in vars(klass):
+            return batch in vars(klass)
+    return False
+
+# v (vec3) as a 3x1 array, broadcastable against 3xN batches
+def to_array(v, dtype):
+    return np.array([[v.x], [v.y], [v.z]], dtype=dtype)
+
+# vectors (3x... array), returns their lengths
+def norm_batch(vectors):
+    return np.sqrt((vectors * vectors).sum(axis=0))
+
+# renders the image through Renderer.render_row one row at a time
+#
+# returns a height x width x 3 array of uint8 like Renderer.render_image
+def render_serial(renderer, width, height):
+    buf = bytearray(width * height * 3)
+    for j in range(height):
+        renderer.render_row(j, width, height, buf)
+    return np.frombuffer(buf, dtype=np.uint8).reshape(height, width, 3)
+
+#
+#   Parallel rendering
+#
+
+# Side length in pixels of the square tiles handed to each job
+TILE_SIZE = 16
+
+# Set in each worker process by init_worker, so the scene is
+# pickled once per worker rather than once per tile
+worker_renderer = None
+worker_size = None
+
+def init_worker(renderer, width, height):
+    global worker_renderer, worker_size
+    worker_renderer = renderer
+    worker_size = (width, height)
+
+# tile (int, int) is the top left corner of a TILE_SIZE x TILE_SIZE
+# tile, clipped to the edges of the screen
+#
+# returns (tile, bytes) where bytes holds the RGB values of the tile
+# row by row
+def render_tile(tile):
+    width, height = worker_size
+    tx, ty = tile
+    tile_width = min(TILE_SIZE, width - tx)
+    tile_height = min(TILE_SIZE, height - ty)
+    buf = bytearray(tile_width * tile_height * 3)
+    for row, j in enumerate(range(ty, ty + tile_height)):
+        worker_renderer.render_row(j, width, height, buf, row * tile_width * 3, tx, tx + tile_width)
+    return tile, bytes(buf)
+
+# renders the image through Renderer.render_row, one tile per job on a
+# pool of worker processes, so it works for any Renderable or Light
+#
+# returns a height x width x 3 array of uint8 like Renderer.render_image
+def render_parallel(renderer, width, height):
+    output = np.empty((height, width, 3), dtype=np.uint8)
+    tiles = [
+        (tx, ty)
+        for ty in range(0, height, TILE_SIZE)
+        for tx in range(0, width, TILE_SIZE)
+    ]
+    # spawn rather than fork, since forking after numba has started its
+    # threads leaves the process unable to exit
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(initializer=init_worker, initargs=(renderer, width, height)) as pool:
+        for (tx, ty), buf in pool.imap_unordered(render_tile, tiles):
+            tile = output[ty:ty+TILE_SIZE, tx:tx+TILE_SIZE]
+            tile[...] = np.frombuffer(buf, dtype=np.uint8).reshape(tile.shape)
+    return output
+
 if __name__ == '__main__':
     #
     #   Scene is described here
@@ -189,9 +631,6 @@ if __name__ == '__main__':
     width = 2**8
     height = 2**8
 
-    img = Image.new( 'RGB', (width,height), "black")
-    pixels = img.load()
-
     renderer = Renderer()
     renderer.lights = [
         PhongLight(vec3(0.5,-1,3.5), vec3(0,0,1), vec3(0,0,1))
@@ -201,9 +640,14 @@ if __name__ == '__main__':
         Triangle(vec3(0.5,0,3), vec3(0,0.5,5), vec3(0.4,0.4,4))
     ]
 
-    for i in range(img.size[0]):
-        print(f"Rendering column ({i}/{img.size[0]})")
-        for j in range(img.size[1]):
-            pixels[i,j] = renderer.render(i,j,width,height)
+    # python renderer_skeleton.py [image|serial|processes]
+    mode = sys.argv[1] if len(sys.argv) > 1 else 'image'
+    if mode == 'serial':
+        output = render_serial(renderer, width, height)
+    elif mode == 'processes':
+        output = render_parallel(renderer, width, height)
+    else:
+        output = renderer.render_image(width, height)
 
+    img = Image.fromarray(output, 'RGB')
     img.save('output.png')
@@ -0,0 +1,7 @@
+from setuptools import setup
+from Cython.Build import cythonize
+
+# Builds the optional _sphere_intersect extension:
+#
+#   python setup.py build_ext --inplace
+setup(ext_modules=cythonize(['_sphere_intersect.pyx']))